@@ -1,12 +1,101 @@
 import duckdb
 import numpy as np
+import pyarrow as pa
 import json
 import logging
+import os
+import uuid
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+from core.faiss_index import BruteForceVectorIndex, FaissVectorIndex, FAISS_AVAILABLE
 
 logger = logging.getLogger(__name__)
 
+# orjson decodes the properties JSON several times faster than the stdlib;
+# fall back silently when it is not installed.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Dimension of the sentence-transformer embeddings (all-MiniLM-L6-v2).
+EMBEDDING_DIM = 384
+
+# Sign bits of a 384-d embedding packed into uint64 words.
+BITS_WORDS = EMBEDDING_DIM // 64
+
+# Bump whenever _create_tables changes shape; startup skips all DDL when the
+# stored version matches.
+SCHEMA_VERSION = 4
+
+# Known, stable property fields per source type. These are materialized into
+# the typed properties_struct column at insert time so filters and
+# projections on them scan native columns instead of reparsing JSON; the
+# properties JSON column stays the authoritative, schemaless record.
+SOURCE_SCHEMAS: Dict[str, List[Tuple[str, str]]] = {
+    "vector": [
+        ("country", "VARCHAR"),
+        ("population", "BIGINT"),
+        ("description", "VARCHAR"),
+        ("category", "VARCHAR"),
+    ],
+}
+
+# Union of all registered fields, in declaration order.
+_STRUCT_FIELDS: List[Tuple[str, str]] = []
+for _fields in SOURCE_SCHEMAS.values():
+    for _field in _fields:
+        if _field not in _STRUCT_FIELDS:
+            _STRUCT_FIELDS.append(_field)
+
+_STRUCT_TYPE = "STRUCT(" + ", ".join(f"{n} {t}" for n, t in _STRUCT_FIELDS) + ")"
+
+_ARROW_TYPES = {"VARCHAR": pa.string(), "BIGINT": pa.int64(), "DOUBLE": pa.float64(), "FLOAT": pa.float32()}
+_STRUCT_ARROW_TYPE = pa.struct([(n, _ARROW_TYPES[t]) for n, t in _STRUCT_FIELDS])
+
+
+def _coerce_struct_value(value: Any, sql_type: str) -> Any:
+    """Coerce a property value to the declared struct type, or None.
+
+    properties is schemaless user input, so a registered field can arrive
+    with any shape ("8,175,133", "many", a nested dict). Values that do not
+    fit the declared column become NULL in the struct; the properties JSON
+    column keeps the original record either way.
+    """
+    if value is None:
+        return None
+    if sql_type == "VARCHAR":
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (bool, int, float)):
+            return str(value)
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        return int(value) if sql_type == "BIGINT" else float(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _struct_values(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Project the registered typed fields out of a properties dict."""
+    return {name: _coerce_struct_value(properties.get(name), sql_type)
+            for name, sql_type in _STRUCT_FIELDS}
+
+
+# Columns added since the first shipped schema, with their types. Used both
+# to verify that a stored version stamp matches the actual table shape and
+# to migrate older databases in place.
+_MIGRATED_COLUMNS: Dict[str, str] = {
+    "properties_struct": _STRUCT_TYPE,
+    "embedding_i8": f"TINYINT[{EMBEDDING_DIM}]",
+    "embedding_scale": "FLOAT",
+    "embedding_bits": f"UBIGINT[{BITS_WORDS}]",
+}
+
 
 class DuckDBManager:
     def __init__(self, db_path: str = "data/geo_embeddings.duckdb"):
@@ -14,11 +103,153 @@ class DuckDBManager:
         self.db_path.parent.mkdir(exist_ok=True, parents=True)
         self.conn = duckdb.connect(str(self.db_path))
         self.spatial_enabled = False  # Track if spatial extension is available
+        self.vss_enabled = False  # Track if the vss (vector index) extension is available
         self._init_extensions()
-        self._create_tables()
+        if self._schema_current():
+            logger.info("Schema is current; skipping DDL")
+        else:
+            self._migrate_schema()
+            self._create_tables()
+            self._write_schema_version()
+        # Let DuckDB parallelize the similarity scan across all cores.
+        self.conn.execute(f"PRAGMA threads={os.cpu_count()};")
+        self._prepare_statements()
+        # Optional in-process vector index; DuckDB stays the ground truth.
+        self.faiss_index = None
+        try:
+            self._init_faiss_index()
+        except Exception as e:
+            logger.warning(f"Could not build in-process vector index: {e}; "
+                           f"similarity search stays on DuckDB")
+
+    def _init_faiss_index(self):
+        """Build the in-memory index from the stored embeddings.
+
+        Uses Faiss HNSW when faiss is installed, otherwise an exact
+        brute-force scan index with the Numba-JIT'd top-K kernel.
+        """
+        if FAISS_AVAILABLE:
+            index = FaissVectorIndex(EMBEDDING_DIM)
+        else:
+            index = BruteForceVectorIndex(EMBEDDING_DIM)
+        rows = self.conn.execute(
+            "SELECT id, embedding FROM geospatial_embeddings WHERE embedding IS NOT NULL").fetchall()
+        if rows:
+            ids = [str(row[0]) for row in rows]
+            embeddings = np.asarray([row[1] for row in rows], dtype=np.float32)
+            index.add(ids, embeddings)
+        self.faiss_index = index
+        logger.info(f"Built in-process {type(index).__name__} over {len(index)} embeddings")
+
+    def _schema_current(self) -> bool:
+        """Check the stored schema version so restarts skip the DDL entirely.
+
+        The stamp alone is not trusted: the columns it promises must actually
+        exist, so a database stamped over an old table shape still gets
+        migrated on the next start instead of failing on every insert.
+        """
+        try:
+            row = self.conn.execute("SELECT value FROM _meta WHERE key = 'schema_version'").fetchone()
+            if row is None or int(row[0]) != SCHEMA_VERSION:
+                return False
+            columns = self._table_columns()
+            return bool(columns) and all(c in columns for c in _MIGRATED_COLUMNS)
+        except Exception:
+            # _meta missing means a fresh or pre-versioning database
+            return False
+
+    def _table_columns(self) -> Dict[str, str]:
+        """Map the embeddings table's column names to their declared types."""
+        rows = self.conn.execute(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_name = 'geospatial_embeddings'").fetchall()
+        return {name: dtype for name, dtype in rows}
+
+    def _migrate_schema(self):
+        """Bring a database created by an older build up to the current shape.
+
+        CREATE TABLE IF NOT EXISTS is a no-op on an existing table, and
+        docker-compose mounts ../data across upgrades, so real deployments
+        open old databases with the original column set. Add the missing
+        columns, widen the embedding column to the fixed-size array the
+        query kernels expect, and backfill the derived columns from the
+        stored rows. Any failure propagates, so the schema version is never
+        stamped over a broken shape.
+        """
+        columns = self._table_columns()
+        if not columns:
+            # Fresh database; _create_tables builds the current shape directly.
+            return
+        missing = {c: t for c, t in _MIGRATED_COLUMNS.items() if c not in columns}
+        needs_embedding_cast = columns.get("embedding") == "FLOAT[]"
+        if not missing and not needs_embedding_cast:
+            return
+
+        logger.info(f"Migrating geospatial_embeddings to schema version {SCHEMA_VERSION}: "
+                    f"adding columns {sorted(missing)}")
+        if needs_embedding_cast:
+            # The original schema stored variable-length FLOAT[] lists, with
+            # an empty list standing in for "no vector"; the fixed-size
+            # kernels need FLOAT[dim] with NULL for absent vectors.
+            self.conn.execute(
+                f"UPDATE geospatial_embeddings SET embedding = NULL WHERE len(embedding) != {EMBEDDING_DIM};")
+            self.conn.execute(
+                f"ALTER TABLE geospatial_embeddings ALTER embedding TYPE FLOAT[{EMBEDDING_DIM}];")
+        for col, col_type in missing.items():
+            self.conn.execute(f"ALTER TABLE geospatial_embeddings ADD COLUMN {col} {col_type};")
+        self._backfill_derived_columns()
+
+    def _backfill_derived_columns(self):
+        """Recompute the quantized and struct columns for pre-migration rows."""
+        rows = self.conn.execute("""
+        SELECT id, embedding, properties FROM geospatial_embeddings
+        WHERE (embedding IS NOT NULL AND embedding_i8 IS NULL)
+           OR (properties IS NOT NULL AND properties_struct IS NULL)
+        """).fetchall()
+        for row_id, embedding, properties in rows:
+            struct = _struct_values(_json_loads(properties)) if properties else None
+            if embedding is not None:
+                arr = self._normalize(np.asarray(embedding, dtype=np.float32))
+                quantized, scale = self._quantize_int8(arr)
+                self.conn.execute(
+                    "UPDATE geospatial_embeddings SET embedding = ?, embedding_i8 = ?, "
+                    "embedding_scale = ?, embedding_bits = ?, properties_struct = ? WHERE id = ?",
+                    (arr, quantized, float(scale.reshape(-1)[0]), self._pack_bits(arr), struct, row_id))
+            else:
+                self.conn.execute(
+                    "UPDATE geospatial_embeddings SET properties_struct = ? WHERE id = ?",
+                    (struct, row_id))
+        if rows:
+            logger.info(f"Backfilled derived columns for {len(rows)} existing rows")
+
+    def _write_schema_version(self):
+        self.conn.execute("CREATE TABLE IF NOT EXISTS _meta (key VARCHAR PRIMARY KEY, value VARCHAR);")
+        self.conn.execute("""
+        INSERT INTO _meta (key, value) VALUES ('schema_version', ?)
+        ON CONFLICT (key) DO UPDATE SET value = excluded.value;
+        """, (str(SCHEMA_VERSION),))
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Return a new cursor sharing this connection's catalog and buffers.
+
+        FastAPI runs handlers on a threadpool; a DuckDB connection is not
+        safe for concurrent statements, but cursors are cheap and let each
+        request execute independently.
+        """
+        return self.conn.cursor()
 
     def _init_extensions(self):
         """Initialize DuckDB extensions with proper error handling."""
+        # A pre-packaged extension directory (baked into the Docker image by
+        # install_duckdb_extensions.py) lets LOAD find the binaries without
+        # any install step or network access at startup.
+        ext_dir = os.environ.get("DUCKDB_EXTENSION_DIRECTORY")
+        if ext_dir:
+            try:
+                self.conn.execute(f"SET extension_directory = '{ext_dir}';")
+            except Exception as e:
+                logger.warning(f"Could not set extension_directory to {ext_dir}: {e}")
+
         # JSON extension is required for basic functionality
         self._load_extension('json', required=True)
         
@@ -29,19 +260,43 @@ class DuckDBManager:
             logger.warning("Spatial extension is not available. Geospatial features will be disabled. "
                          "This is common on ARM64 systems where the spatial extension may not be available.")
 
+        # VSS extension is optional - without it similarity search falls back
+        # to the sequential scan
+        self.vss_enabled = self._load_extension('vss', required=False)
+        if not self.vss_enabled:
+            logger.warning("VSS extension is not available. Similarity search will use a full scan "
+                         "instead of the HNSW index.")
+
     def _load_extension(self, ext_name: str, required: bool = True) -> bool:
         """Load a single extension with proper error handling."""
         install_error = None
-        
+
+        # Consult the extension catalog first: if the extension is already
+        # loaded (e.g. statically linked) there is nothing to do, and if it
+        # is already installed the INSTALL (and its disk/network hit) can be
+        # skipped in favour of a bare LOAD.
+        already_installed = False
         try:
-            # First, try to install the extension
-            logger.info(f"Installing {ext_name} extension...")
-            self.conn.execute(f"INSTALL {ext_name};")
-            logger.info(f"Successfully installed {ext_name} extension")
-        except Exception as e:
-            install_error = e
-            logger.warning(f"Install command for {ext_name} extension failed: {install_error}")
-            # This might be expected if extension is already installed
+            row = self.conn.execute(
+                "SELECT installed, loaded FROM duckdb_extensions() WHERE extension_name = ?",
+                (ext_name,)).fetchone()
+            if row and row[1]:
+                logger.info(f"{ext_name} extension is already loaded")
+                return True
+            already_installed = bool(row and row[0])
+        except Exception as catalog_error:
+            logger.warning(f"Could not query extension catalog: {catalog_error}")
+
+        if not already_installed:
+            try:
+                # First, try to install the extension
+                logger.info(f"Installing {ext_name} extension...")
+                self.conn.execute(f"INSTALL {ext_name};")
+                logger.info(f"Successfully installed {ext_name} extension")
+            except Exception as e:
+                install_error = e
+                logger.warning(f"Install command for {ext_name} extension failed: {install_error}")
+                # This might be expected if extension is already installed
         
         try:
             # Now try to load the extension
@@ -79,19 +334,23 @@ class DuckDBManager:
             if self.spatial_enabled:
                 # Full spatial table with geometry column and spatial index
                 # Create table first
-                self.conn.execute("""
+                self.conn.execute(f"""
                 CREATE TABLE IF NOT EXISTS geospatial_embeddings (
                     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                     name VARCHAR NOT NULL,
                     source_type VARCHAR NOT NULL,
                     properties JSON,
+                    properties_struct {_STRUCT_TYPE},
                     geometry GEOMETRY,
-                    embedding FLOAT[],
+                    embedding FLOAT[{EMBEDDING_DIM}],
+                    embedding_i8 TINYINT[{EMBEDDING_DIM}],
+                    embedding_scale FLOAT,
+                    embedding_bits UBIGINT[{BITS_WORDS}],
                     embedding_model VARCHAR,
                     created_at TIMESTAMP DEFAULT NOW()
                 );
                 """)
-                
+
                 # Create spatial index separately
                 try:
                     self.conn.execute("CREATE INDEX IF NOT EXISTS idx_geometry ON geospatial_embeddings USING RTREE(geometry);")
@@ -100,27 +359,44 @@ class DuckDBManager:
                     
             else:
                 # Basic table without spatial features
-                self.conn.execute("""
+                self.conn.execute(f"""
                 CREATE TABLE IF NOT EXISTS geospatial_embeddings (
                     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
                     name VARCHAR NOT NULL,
                     source_type VARCHAR NOT NULL,
                     properties JSON,
+                    properties_struct {_STRUCT_TYPE},
                     geometry_json VARCHAR,  -- Store geometry as JSON string instead of GEOMETRY type
-                    embedding FLOAT[],
+                    embedding FLOAT[{EMBEDDING_DIM}],
+                    embedding_i8 TINYINT[{EMBEDDING_DIM}],
+                    embedding_scale FLOAT,
+                    embedding_bits UBIGINT[{BITS_WORDS}],
                     embedding_model VARCHAR,
                     created_at TIMESTAMP DEFAULT NOW()
                 );
                 """)
-            
-            # Create cosine similarity macro
-            self.conn.execute("""
-            CREATE OR REPLACE MACRO cosine_similarity(a, b) AS (
-                list_dot_product(a::FLOAT[], b::FLOAT[]) / 
-                (sqrt(list_dot_product(a::FLOAT[], a::FLOAT[])) * sqrt(list_dot_product(b::FLOAT[], b::FLOAT[])))
-            );
-            """)
-            
+
+            # Hamming distance over the packed sign bits: one XOR + popcount
+            # per word, the cheapest possible first-stage ranking.
+            # bit_count returns TINYINT, so cast before summing to avoid overflow
+            hamming_terms = " + ".join(
+                f"bit_count(xor(a[{i + 1}], b[{i + 1}]))::INTEGER" for i in range(BITS_WORDS))
+            self.conn.execute(f"CREATE OR REPLACE MACRO hamming_bits(a, b) AS ({hamming_terms});")
+
+            # HNSW index over the embedding column turns the top-K query from a
+            # full scan into a graph traversal; persistence for HNSW indexes is
+            # still experimental in vss, so failure only disables the ANN path.
+            if self.vss_enabled:
+                try:
+                    self.conn.execute("SET hnsw_enable_experimental_persistence = true;")
+                    self.conn.execute("""
+                    CREATE INDEX IF NOT EXISTS emb_hnsw ON geospatial_embeddings
+                    USING HNSW (embedding) WITH (metric = 'cosine');
+                    """)
+                except Exception as idx_error:
+                    logger.warning(f"Could not create HNSW index: {idx_error}")
+                    self.vss_enabled = False
+
             table_type = "spatial" if self.spatial_enabled else "basic"
             logger.info(f"Successfully created geospatial_embeddings table ({table_type} mode) and related objects")
             
@@ -129,35 +405,154 @@ class DuckDBManager:
             raise RuntimeError(f"Database table creation failed. This might indicate missing "
                              f"extensions or incompatible SQL syntax. Error: {e}")
 
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        """L2-normalize embeddings (single vector or batch) as contiguous float32.
+
+        Stored and query vectors are unit-length, so cosine similarity reduces
+        to a plain inner product at query time.
+        """
+        embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding, axis=-1, keepdims=True)
+        return embedding / np.maximum(norm, np.finfo(np.float32).tiny)
+
+    @staticmethod
+    def _quantize_int8(embeddings: np.ndarray) -> tuple:
+        """Scalar-quantize embeddings (single vector or batch) to int8.
+
+        Each vector gets its own scale of 127 / max_abs so the full int8
+        range is used; the scale is stored alongside the vector to undo the
+        scaling during the candidate scan.
+        """
+        max_abs = np.max(np.abs(embeddings), axis=-1, keepdims=True)
+        scale = 127.0 / np.maximum(max_abs, np.finfo(np.float32).tiny)
+        quantized = np.round(embeddings * scale).astype(np.int8)
+        return quantized, scale.astype(np.float32)
+
+    @staticmethod
+    def _pack_bits(embeddings: np.ndarray) -> np.ndarray:
+        """Pack embedding sign bits into uint64 words (binary quantization)."""
+        return np.packbits((embeddings > 0).astype(np.uint8), axis=-1).view(np.uint64)
+
     def insert_embedding(self, name: str, source_type: str, properties: Dict[str, Any],
                          geometry: Optional[str], embedding: np.ndarray, model: str) -> str:
         """Insert a new embedding record into the database."""
-        embedding_list = embedding.tolist() if embedding is not None else []
-        
+        # The quantized companion columns make a vector mandatory, so fail
+        # with a clear message instead of deep inside the quantizer.
+        if embedding is None:
+            raise ValueError("insert_embedding requires an embedding vector")
+        # Bind the embedding as a contiguous float32 buffer; DuckDB consumes
+        # numpy arrays natively, avoiding a 384-element list of boxed floats.
+        embedding_arr = self._normalize(embedding)
+        embedding_i8, scale = self._quantize_int8(embedding_arr)
+        scale = float(scale.reshape(-1)[0])
+        embedding_bits = self._pack_bits(embedding_arr)
+
         if self.spatial_enabled:
             # Use spatial functions when available
             sql = """
-            INSERT INTO geospatial_embeddings (name, source_type, properties, geometry, embedding, embedding_model)
-            VALUES (?, ?, ?, ST_GeomFromGeoJSON(?), ?, ?)
+            INSERT INTO geospatial_embeddings (name, source_type, properties, properties_struct, geometry, embedding, embedding_i8, embedding_scale, embedding_bits, embedding_model)
+            VALUES (?, ?, ?, ?, ST_GeomFromGeoJSON(?), ?, ?, ?, ?, ?)
             RETURNING id;
             """
-            params = (name, source_type, json.dumps(properties), geometry, embedding_list, model)
+            params = (name, source_type, json.dumps(properties), _struct_values(properties), geometry, embedding_arr, embedding_i8, scale, embedding_bits, model)
         else:
             # Store geometry as JSON string when spatial extension is not available
             sql = """
-            INSERT INTO geospatial_embeddings (name, source_type, properties, geometry_json, embedding, embedding_model)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO geospatial_embeddings (name, source_type, properties, properties_struct, geometry_json, embedding, embedding_i8, embedding_scale, embedding_bits, embedding_model)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             RETURNING id;
             """
-            params = (name, source_type, json.dumps(properties), geometry, embedding_list, model)
-        
+            params = (name, source_type, json.dumps(properties), _struct_values(properties), geometry, embedding_arr, embedding_i8, scale, embedding_bits, model)
+
         try:
             result = self.conn.execute(sql, params).fetchone()
-            return str(result[0])
+            new_id = str(result[0])
         except Exception as e:
             logger.error(f"Failed to insert embedding: {e}")
             raise
 
+        if self.faiss_index is not None and embedding_arr.size:
+            self.faiss_index.add([new_id], embedding_arr.reshape(1, -1))
+        return new_id
+
+    def insert_embeddings_batch(self, names: List[str], properties: List[Dict[str, Any]],
+                                geometries: List[Optional[str]], embeddings: np.ndarray,
+                                model: str, source_type: str = "vector") -> List[str]:
+        """Insert many embedding records in one statement via a registered Arrow table.
+
+        The batch arrives as parallel columns - ``names``, ``properties``
+        dicts, GeoJSON ``geometries`` strings (or None) and the matching
+        ``(N, dim)`` embedding array - which map straight onto the Arrow
+        table with no per-row dict staging. The embeddings travel to DuckDB
+        as a single FixedSizeList buffer instead of N Python lists.
+        """
+        n = len(names)
+        if not (len(properties) == len(geometries) == len(embeddings) == n):
+            raise ValueError(f"Column lengths differ: {n} names, {len(properties)} properties, "
+                             f"{len(geometries)} geometries, {len(embeddings)} embeddings")
+        if n == 0:
+            return []
+
+        embeddings = self._normalize(embeddings)
+        embeddings_i8, scales = self._quantize_int8(embeddings)
+        embeddings_bits = self._pack_bits(embeddings)
+        dim = embeddings.shape[1]
+        # Generate ids client-side so the bulk insert needs no RETURNING
+        # round trip through the result materializer.
+        ids = [str(uuid.uuid4()) for _ in range(n)]
+        batch = pa.table({
+            "id": pa.array(ids, pa.string()),
+            "name": pa.array(names, pa.string()),
+            "source_type": pa.array([source_type] * n, pa.string()),
+            "properties": pa.array([json.dumps(p) for p in properties], pa.string()),
+            "properties_struct": pa.array([_struct_values(p) for p in properties], _STRUCT_ARROW_TYPE),
+            "geometry": pa.array(geometries, pa.string()),
+            "embedding": pa.FixedSizeListArray.from_arrays(pa.array(embeddings.ravel(), pa.float32()), dim),
+            "embedding_i8": pa.FixedSizeListArray.from_arrays(pa.array(embeddings_i8.ravel(), pa.int8()), dim),
+            "embedding_scale": pa.array(scales.ravel(), pa.float32()),
+            "embedding_bits": pa.FixedSizeListArray.from_arrays(pa.array(embeddings_bits.ravel(), pa.uint64()), BITS_WORDS),
+            "embedding_model": pa.array([model] * n, pa.string()),
+        })
+
+        if self.spatial_enabled:
+            geometry_expr = "ST_GeomFromGeoJSON(geometry)"
+            geometry_col = "geometry"
+        else:
+            geometry_expr = "geometry"
+            geometry_col = "geometry_json"
+
+        sql = f"""
+        INSERT INTO geospatial_embeddings (id, name, source_type, properties, properties_struct, {geometry_col}, embedding, embedding_i8, embedding_scale, embedding_bits, embedding_model)
+        SELECT id, name, source_type, properties, properties_struct, {geometry_expr}, embedding, embedding_i8, embedding_scale, embedding_bits, embedding_model FROM embedding_batch;
+        """
+
+        # A dedicated cursor keeps the registered table and the transaction
+        # private to this call, so batches submitted from worker threads
+        # cannot trample each other on the shared connection.
+        cur = self.conn.cursor()
+        try:
+            cur.register("embedding_batch", batch)
+            try:
+                cur.execute("BEGIN TRANSACTION;")
+                try:
+                    cur.execute(sql)
+                    cur.execute("COMMIT;")
+                except Exception:
+                    cur.execute("ROLLBACK;")
+                    raise
+            finally:
+                cur.unregister("embedding_batch")
+        except Exception as e:
+            logger.error(f"Failed to insert embedding batch: {e}")
+            raise
+        finally:
+            cur.close()
+
+        if self.faiss_index is not None:
+            self.faiss_index.add(ids, embeddings)
+        return ids
+
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the embeddings in the database."""
         sql = "SELECT COUNT(*), COUNT(DISTINCT source_type), COUNT(DISTINCT embedding_model) FROM geospatial_embeddings"
@@ -167,98 +562,196 @@ class DuckDBManager:
                 "total_embeddings": total,
                 "source_types": source_types,
                 "models": models,
-                "spatial_enabled": self.spatial_enabled
+                "spatial_enabled": self.spatial_enabled,
+                "vss_enabled": self.vss_enabled
             }
         except Exception as e:
             logger.error(f"Failed to get stats: {e}")
             raise
 
-    def search_similar_embeddings(self, query_embedding: np.ndarray, limit: int = 10, 
-                                 similarity_threshold: float = 0.7) -> List[Dict[str, Any]]:
+    def search_similar_embeddings(self, query_embedding: np.ndarray, limit: int = 10,
+                                 similarity_threshold: float = 0.7,
+                                 cursor: Optional[duckdb.DuckDBPyConnection] = None) -> List[Dict[str, Any]]:
         """Search for similar embeddings using cosine similarity."""
-        query_list = query_embedding.tolist()
-        
-        if self.spatial_enabled:
-            geometry_col = "ST_AsGeoJSON(geometry) as geometry"
-        else:
-            geometry_col = "geometry_json as geometry"
-        
-        sql = f"""
-        SELECT id, name, source_type, properties, {geometry_col}, 
-               cosine_similarity(embedding, ?) as similarity,
-               embedding_model, created_at
-        FROM geospatial_embeddings
-        WHERE cosine_similarity(embedding, ?) >= ?
-        ORDER BY similarity DESC
-        LIMIT ?
-        """
-        
+        query_arr = self._normalize(query_embedding)
+
+        # Stored embeddings are unit-length, so the inner product against the
+        # normalized query equals cosine similarity and runs on DuckDB's SIMD
+        # fixed-size array kernel.
+        sql = self._sql_exact_scan
+
+        # Each call runs on its own cursor by default so concurrent requests
+        # on the FastAPI threadpool do not serialize on the connection; the
+        # Arrow fetch only materializes Python dicts for the <= limit rows
+        # that survive the ORDER BY ... LIMIT.
+        cur = cursor if cursor is not None else self.cursor()
         try:
-            results = self.conn.execute(sql, (query_list, query_list, similarity_threshold, limit)).fetchall()
-            return [
-                {
-                    "id": str(row[0]),
-                    "name": row[1],
-                    "source_type": row[2],
-                    "properties": json.loads(row[3]) if row[3] else {},
-                    "geometry": row[4],
-                    "similarity": row[5],
-                    "embedding_model": row[6],
-                    "created_at": row[7]
-                }
-                for row in results
-            ]
+            table = cur.execute(sql, (query_arr, query_arr, similarity_threshold, limit)).fetch_arrow_table()
+            rows = table.to_pylist()
+            for row in rows:
+                row["id"] = str(row["id"])
+                row["properties"] = _json_loads(row["properties"]) if row["properties"] else {}
+            return rows
         except Exception as e:
             logger.error(f"Failed to search similar embeddings: {e}")
             raise
+        finally:
+            if cursor is None:
+                cur.close()
 
-    def similarity_search(self, query_embedding: np.ndarray, k: int = 10, 
-                         source_type: Optional[str] = None, similarity_threshold: float = 0.0) -> List[Dict[str, Any]]:
+    def similarity_search(self, query_embedding: np.ndarray, k: int = 10,
+                         source_type: Optional[str] = None, similarity_threshold: float = 0.0,
+                         cursor: Optional[duckdb.DuckDBPyConnection] = None) -> List[Dict[str, Any]]:
         """Search for similar embeddings using cosine similarity (compatibility method)."""
-        query_list = query_embedding.tolist()
-        
-        if self.spatial_enabled:
-            geometry_col = "ST_AsGeoJSON(geometry) as geometry"
-        else:
-            geometry_col = "geometry_json as geometry"
-        
-        # Build the WHERE clause
-        where_clause = "WHERE cosine_similarity(embedding, ?) >= ?"
-        params = [query_list, query_list, similarity_threshold]
-        
-        if source_type:
-            where_clause += " AND source_type = ?"
-            params.append(source_type)
-        
-        sql = f"""
-        SELECT id, name, source_type, properties, {geometry_col}, 
-               cosine_similarity(embedding, ?) as similarity,
-               embedding_model, created_at
-        FROM geospatial_embeddings
-        {where_clause}
-        ORDER BY similarity DESC
-        LIMIT ?
+        # The Arrow fetch keeps the scanned rows columnar in C; only the
+        # final <= k rows are materialized as Python dicts here.
+        table = self.similarity_search_arrow(query_embedding, k, source_type, similarity_threshold, cursor)
+        rows = table.to_pylist()
+        for row in rows:
+            row["id"] = str(row["id"])
+            row["properties"] = _json_loads(row["properties"]) if row["properties"] else {}
+        return rows
+
+    def similarity_search_arrow(self, query_embedding: np.ndarray, k: int = 10,
+                                source_type: Optional[str] = None, similarity_threshold: float = 0.0,
+                                cursor: Optional[duckdb.DuckDBPyConnection] = None) -> pa.Table:
+        """Like similarity_search but returns the result set as an Arrow table.
+
+        Columnar fetch skips per-row tuple materialization; callers that
+        serialize results straight to JSON avoid the dict round trip.
         """
-        params.append(k)
-        
+        cur = cursor if cursor is not None else self.cursor()
         try:
-            results = self.conn.execute(sql, params).fetchall()
-            return [
-                {
-                    "id": str(row[0]),
-                    "name": row[1],
-                    "source_type": row[2],
-                    "properties": json.loads(row[3]) if row[3] else {},
-                    "geometry": row[4],
-                    "similarity": row[5],
-                    "embedding_model": row[6],
-                    "created_at": row[7]
-                }
-                for row in results
-            ]
+            sql, params = self._faiss_query(cur, query_embedding, k, source_type, similarity_threshold) \
+                or self._build_similarity_query(query_embedding, k, source_type, similarity_threshold)
+            return cur.execute(sql, params).fetch_arrow_table()
         except Exception as e:
             logger.error(f"Failed to search similar embeddings: {e}")
             raise
+        finally:
+            if cursor is None:
+                cur.close()
+
+    def _prepare_statements(self):
+        """Build every similarity query text once.
+
+        The Python client does not expose DuckDB's prepared-statement API, so
+        the closest available win is assembling the (spatial-flag dependent)
+        SQL strings a single time at startup instead of re-interpolating them
+        on every request.
+        """
+        geometry_col = "ST_AsGeoJSON(geometry) as geometry" if self.spatial_enabled else "geometry_json as geometry"
+        geometry_col_g = "ST_AsGeoJSON(g.geometry) as geometry" if self.spatial_enabled else "g.geometry_json as geometry"
+
+        # HNSW-accelerated shape: vss rewrites ORDER BY
+        # array_cosine_distance(...) LIMIT k over the indexed column into an
+        # index traversal, but only for this exact unfiltered form - so the
+        # similarity threshold every other path applies is predicated on an
+        # outer select around the top-K instead.
+        self._sql_vss_topk = f"""
+        SELECT * FROM (
+            SELECT id, name, source_type, properties, {geometry_col},
+                   1.0 - array_cosine_distance(embedding, ?::FLOAT[{EMBEDDING_DIM}]) as similarity,
+                   embedding_model, created_at
+            FROM geospatial_embeddings
+            ORDER BY array_cosine_distance(embedding, ?::FLOAT[{EMBEDDING_DIM}])
+            LIMIT ?
+        )
+        WHERE similarity >= ?
+        ORDER BY similarity DESC
+        """
+
+        # Staged scan: the Hamming prefilter streams only the 48-byte packed
+        # sign bits (XOR + popcount per word) to pick a coarse candidate set,
+        # the int8 column refines it (dividing by the stored scale recovers
+        # the approximate inner product), and the exact FP32 vectors re-rank
+        # only the survivors. Inner product on unit-length vectors is cosine
+        # similarity.
+        def staged_scan(source_filter: str) -> str:
+            return f"""
+            WITH coarse AS (
+                SELECT id, name, source_type, properties, {geometry_col}, embedding, embedding_i8, embedding_scale, embedding_model, created_at
+                FROM geospatial_embeddings
+                {source_filter}
+                ORDER BY hamming_bits(embedding_bits, ?::UBIGINT[{BITS_WORDS}]) ASC
+                LIMIT ?
+            ),
+            candidates AS (
+                SELECT * FROM coarse
+                ORDER BY array_inner_product(embedding_i8::FLOAT[{EMBEDDING_DIM}], ?::FLOAT[{EMBEDDING_DIM}]) / embedding_scale DESC
+                LIMIT ?
+            )
+            SELECT id, name, source_type, properties, geometry,
+                   array_inner_product(embedding, ?::FLOAT[{EMBEDDING_DIM}]) as similarity,
+                   embedding_model, created_at
+            FROM candidates
+            WHERE array_inner_product(embedding, ?::FLOAT[{EMBEDDING_DIM}]) >= ?
+            ORDER BY similarity DESC
+            LIMIT ?
+            """
+
+        self._sql_scan = staged_scan("")
+        self._sql_scan_with_source = staged_scan("WHERE source_type = ?")
+
+        self._sql_exact_scan = f"""
+        SELECT id, name, source_type, properties, {geometry_col},
+               array_inner_product(embedding, ?::FLOAT[{EMBEDDING_DIM}]) as similarity,
+               embedding_model, created_at
+        FROM geospatial_embeddings
+        WHERE array_inner_product(embedding, ?::FLOAT[{EMBEDDING_DIM}]) >= ?
+        ORDER BY similarity DESC
+        LIMIT ?
+        """
+
+        self._sql_faiss_join = f"""
+        SELECT g.id, g.name, g.source_type, g.properties, {geometry_col_g},
+               h.similarity, g.embedding_model, g.created_at
+        FROM faiss_hits h
+        JOIN geospatial_embeddings g ON g.id = h.id::UUID
+        ORDER BY h.similarity DESC
+        """
+
+    def _faiss_query(self, cur: duckdb.DuckDBPyConnection, query_embedding: np.ndarray, k: int,
+                     source_type: Optional[str], similarity_threshold: float) -> Optional[Tuple[str, List[Any]]]:
+        """Answer the top-K from the in-process Faiss index when possible.
+
+        Returns the (sql, params) of a metadata join against the candidate
+        ids registered on the cursor, or None when the index is unavailable
+        or the query needs filtering the index cannot do.
+        """
+        if self.faiss_index is None or len(self.faiss_index) == 0:
+            return None
+        if source_type is not None or similarity_threshold > 0.0:
+            return None
+
+        hits = self.faiss_index.search(self._normalize(query_embedding), k)
+        # The scan paths filter on the threshold in SQL; mirror it here so
+        # results do not depend on which backend answered the query.
+        hits = [(hit_id, score) for hit_id, score in hits if score >= similarity_threshold]
+
+        cur.register("faiss_hits", pa.table({
+            "id": pa.array([hit_id for hit_id, _ in hits], pa.string()),
+            "similarity": pa.array([score for _, score in hits], pa.float32()),
+        }))
+        return self._sql_faiss_join, []
+
+    def _build_similarity_query(self, query_embedding: np.ndarray, k: int,
+                                source_type: Optional[str], similarity_threshold: float) -> tuple:
+        """Pick the cached SQL and build the parameter list for a search."""
+        query_arr = self._normalize(query_embedding)
+
+        if self.vss_enabled and source_type is None and similarity_threshold <= 0.0:
+            return self._sql_vss_topk, [query_arr, query_arr, k, similarity_threshold]
+
+        if source_type:
+            sql = self._sql_scan_with_source
+            params: List[Any] = [source_type]
+        else:
+            sql = self._sql_scan
+            params = []
+        query_bits = self._pack_bits(query_arr)
+        params += [query_bits, k * 10, query_arr, k * 4, query_arr, query_arr, similarity_threshold, k]
+        return sql, params
 
     def close(self):
         """Close the database connection."""
@@ -0,0 +1,97 @@
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from core.similarity import topk_inner_product
+
+logger = logging.getLogger(__name__)
+
+# Faiss is optional - without it similarity search stays on the DuckDB scan.
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    faiss = None
+    FAISS_AVAILABLE = False
+
+
+class FaissVectorIndex:
+    """In-process HNSW index over the stored embeddings.
+
+    DuckDB remains the ground truth; this index only answers top-K queries
+    in memory, keyed by row id, and the caller joins back to DuckDB for
+    metadata. Vectors are expected to be L2-normalized, so inner product
+    equals cosine similarity.
+
+    Inserts run on FastAPI worker threads, and faiss's HNSW add releases
+    the GIL without being thread-safe, so all mutation (and add-vs-search)
+    is serialized behind a lock.
+    """
+
+    def __init__(self, dim: int, hnsw_m: int = 32):
+        if not FAISS_AVAILABLE:
+            raise RuntimeError("faiss is not installed")
+        self.dim = dim
+        self.index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        self.ids: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: List[str], embeddings: np.ndarray):
+        """Append vectors for the given row ids."""
+        if len(ids) == 0:
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock:
+            self.index.add(embeddings)
+            self.ids.extend(ids)
+
+    def search(self, query_embedding: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """Return up to k (row id, similarity) pairs, best first."""
+        query = np.ascontiguousarray(query_embedding, dtype=np.float32).reshape(1, self.dim)
+        with self._lock:
+            if not self.ids:
+                return []
+            scores, indices = self.index.search(query, min(k, len(self.ids)))
+            return [(self.ids[i], float(s)) for i, s in zip(indices[0], scores[0]) if i >= 0]
+
+
+class BruteForceVectorIndex:
+    """Drop-in replacement for FaissVectorIndex when faiss is not installed.
+
+    Keeps the embeddings in one contiguous float32 matrix and answers top-K
+    with the (Numba-accelerated) inner-product kernel - an exact scan, but
+    entirely in SIMD arithmetic with no per-row Python objects. The same
+    lock discipline as FaissVectorIndex keeps the matrix and the id list
+    aligned under concurrent inserts.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._embeddings = np.empty((0, dim), dtype=np.float32)
+        self.ids: List[str] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, ids: List[str], embeddings: np.ndarray):
+        """Append vectors for the given row ids."""
+        if len(ids) == 0:
+            return
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(ids), self.dim)
+        with self._lock:
+            self._embeddings = np.concatenate([self._embeddings, embeddings])
+            self.ids.extend(ids)
+
+    def search(self, query_embedding: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """Return up to k (row id, similarity) pairs, best first."""
+        with self._lock:
+            if not self.ids:
+                return []
+            indices, scores = topk_inner_product(self._embeddings, query_embedding, k)
+            return [(self.ids[i], float(s)) for i, s in zip(indices, scores)]
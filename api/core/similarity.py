@@ -0,0 +1,45 @@
+import numpy as np
+
+# Numba is optional - the kernel falls back to a NumPy matmul, which is
+# still vectorized but single-pass over memory rather than parallel.
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _inner_products(embeddings, query):
+        n, dim = embeddings.shape
+        scores = np.empty(n, dtype=np.float32)
+        for i in prange(n):
+            acc = np.float32(0.0)
+            for j in range(dim):
+                acc += embeddings[i, j] * query[j]
+            scores[i] = acc
+        return scores
+else:
+    def _inner_products(embeddings, query):
+        return embeddings @ query
+
+
+def topk_inner_product(embeddings: np.ndarray, query: np.ndarray, k: int):
+    """Top-k rows of ``embeddings`` by inner product with ``query``.
+
+    Returns ``(indices, scores)`` sorted best-first. On unit-length vectors
+    the inner product is cosine similarity. The scoring loop is Numba-JIT'd
+    (parallel, fastmath) when numba is installed, so the scan stays in SIMD
+    float32 arithmetic instead of materializing Python floats per row.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    query = np.ascontiguousarray(query, dtype=np.float32)
+    scores = _inner_products(embeddings, query)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    order = np.argsort(-scores[candidates])
+    indices = candidates[order]
+    return indices, scores[indices]
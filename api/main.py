@@ -4,7 +4,7 @@ from contextlib import asynccontextmanager
 import uvicorn
 
 from core.duckdb_manager import DuckDBManager
-from routers import vector, search
+from core.context_lang import get_embedder
 
 db_manager = None
 
@@ -12,6 +12,9 @@ db_manager = None
 async def lifespan(app: FastAPI):
     global db_manager
     db_manager = DuckDBManager("data/geo_embeddings.duckdb")
+    # Pre-warm the embedder so the first request pays neither the model load
+    # nor the lazy kernel/tokenizer initialization of the first encode.
+    get_embedder().embed_text("warmup")
     yield
     if db_manager:
         db_manager.close()
@@ -33,6 +36,10 @@ app.add_middleware(
 def get_db_manager() -> DuckDBManager:
     return db_manager
 
+# Routers import get_db_manager from this module, so they must be imported
+# after it is defined to avoid a circular import.
+from routers import vector, search
+
 app.include_router(vector.router, prefix="/embed/vector", tags=["vector-embeddings"])
 app.include_router(search.router, prefix="/search", tags=["search"])
 
@@ -1,14 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 import numpy as np
+import orjson
 
 from core.duckdb_manager import DuckDBManager
-from core.context_lang import ContextLanguageEmbedder
+from core.context_lang import get_embedder
 from api.main import get_db_manager
 
 router = APIRouter()
-embedder = ContextLanguageEmbedder()
 
 class SearchRequest(BaseModel):
     query_text: str
@@ -22,11 +22,23 @@ class SearchResult(BaseModel):
     properties: Dict[str, Any]
     similarity: float
 
+# The search SQL also carries geometry/model/created_at columns; project to
+# exactly the declared response schema before serializing.
+_RESULT_COLUMNS = list(SearchResult.model_fields)
+
 @router.post("/semantic", response_model=List[SearchResult])
 async def semantic_search(request: SearchRequest, db: DuckDBManager = Depends(get_db_manager)):
     try:
+        embedder = get_embedder()
         q_emb = embedder.embed_text(request.query_text)
-        results = db.similarity_search(query_embedding=q_emb, k=request.k, source_type=request.source_type)
-        return [SearchResult(**r) for r in results]
+        results = db.similarity_search_arrow(query_embedding=q_emb, k=request.k, source_type=request.source_type)
+        # Serialize the Arrow result straight to JSON with orjson instead of
+        # round-tripping every row through a Pydantic model; the response_model
+        # above remains the OpenAPI declaration for this endpoint.
+        rows = results.select(_RESULT_COLUMNS).to_pylist()
+        for row in rows:
+            row["id"] = str(row["id"])
+            row["properties"] = orjson.loads(row["properties"]) if row["properties"] else {}
+        return Response(content=orjson.dumps(rows), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
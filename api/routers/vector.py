@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+import asyncio
 import numpy as np
-import json
+import orjson
 from core.duckdb_manager import DuckDBManager
-from core.context_lang import ContextLanguageEmbedder
+from core.context_lang import get_embedder
 from api.main import get_db_manager
 
 router = APIRouter()
-embedder = ContextLanguageEmbedder()
 
 class GeoJSONFeature(BaseModel):
     type: str
@@ -28,18 +28,19 @@ class VectorEmbeddingResponse(BaseModel):
 @router.post("/", response_model=VectorEmbeddingResponse)
 async def embed_vectors(request: VectorEmbeddingRequest, db: DuckDBManager = Depends(get_db_manager)):
     try:
-        embedding_ids = []
-        for f in request.features:
-            emb = embedder.embed_feature(f.dict(), request.context_template, request.include_topology)
-            emb_id = db.insert_embedding(
-                name=f.properties.get('name', 'Unknown'),
-                source_type="vector",
-                properties=f.properties,
-                geometry=json.dumps(f.geometry) if f.geometry else None,
-                embedding=emb,
-                model=embedder.model_name
-            )
-            embedding_ids.append(emb_id)
+        embedder = get_embedder()
+        feats = [f.model_dump() for f in request.features]
+        # Encoding and the bulk insert are synchronous CPU/DB work; run them
+        # off the event loop so other requests keep being served meanwhile.
+        embeddings = await asyncio.to_thread(
+            embedder.embed_features, feats, request.context_template, request.include_topology
+        )
+        names = [f["properties"].get('name', 'Unknown') for f in feats]
+        props = [f["properties"] for f in feats]
+        geoms = [orjson.dumps(f["geometry"]).decode() if f["geometry"] else None for f in feats]
+        embedding_ids = await asyncio.to_thread(
+            db.insert_embeddings_batch, names, props, geoms, embeddings, embedder.model_name
+        )
         return VectorEmbeddingResponse(feature_count=len(embedding_ids), embedding_ids=embedding_ids,
                                        model_info={"model": embedder.model_name, "embedding_dim": embedder.embedding_dim})
     except Exception as e:
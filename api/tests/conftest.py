@@ -0,0 +1,10 @@
+import sys
+from pathlib import Path
+
+# The api modules import each other as top-level packages (core.*,
+# routers.*), so the api directory itself must be importable, alongside the
+# repo root for `from api.main import app`.
+_API_DIR = Path(__file__).resolve().parents[1]
+for _path in (str(_API_DIR.parent), str(_API_DIR)):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
@@ -0,0 +1,161 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import duckdb
+import numpy as np
+import pytest
+
+from core.duckdb_manager import DuckDBManager, EMBEDDING_DIM, SCHEMA_VERSION
+from core.faiss_index import FAISS_AVAILABLE, BruteForceVectorIndex, FaissVectorIndex
+
+# The table shape shipped before schema versioning existed; docker-compose
+# mounts ../data across upgrades, so the manager must open databases with
+# this layout and migrate them.
+OLD_SCHEMA = """
+CREATE TABLE geospatial_embeddings (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    name VARCHAR NOT NULL,
+    source_type VARCHAR NOT NULL,
+    properties JSON,
+    geometry_json VARCHAR,
+    embedding FLOAT[],
+    embedding_model VARCHAR,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+"""
+
+
+def _unit_vector(seed: int) -> np.ndarray:
+    vec = np.random.default_rng(seed).normal(size=EMBEDDING_DIM).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+
+def _create_old_database(db_path) -> np.ndarray:
+    conn = duckdb.connect(str(db_path))
+    conn.execute(OLD_SCHEMA)
+    old_vec = _unit_vector(0)
+    conn.execute(
+        "INSERT INTO geospatial_embeddings (name, source_type, properties, embedding, embedding_model) "
+        "VALUES (?, ?, ?, ?, ?)",
+        ("Old Row", "vector", json.dumps({"country": "Oldland"}), old_vec.tolist(), "m"),
+    )
+    conn.close()
+    return old_vec
+
+
+def test_migrates_pre_versioning_database(tmp_path):
+    db_path = tmp_path / "old.duckdb"
+    old_vec = _create_old_database(db_path)
+
+    db = DuckDBManager(str(db_path))
+    try:
+        # The old row is searchable through the staged scan, which needs the
+        # backfilled embedding_bits / embedding_i8 columns.
+        results = db.similarity_search(old_vec, k=1, source_type="vector")
+        assert results and results[0]["name"] == "Old Row"
+        assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+
+        # New inserts need the migrated properties_struct column.
+        new_id = db.insert_embedding("New Row", "vector", {"country": "X"}, None, _unit_vector(1), "m")
+        assert new_id
+    finally:
+        db.close()
+
+
+def test_migrates_despite_stale_version_stamp(tmp_path):
+    # A version stamp written over an old table shape (as earlier builds
+    # did) must not stop the migration on the next start.
+    db_path = tmp_path / "stamped.duckdb"
+    _create_old_database(db_path)
+    conn = duckdb.connect(str(db_path))
+    conn.execute("CREATE TABLE _meta (key VARCHAR PRIMARY KEY, value VARCHAR);")
+    conn.execute("INSERT INTO _meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+    conn.close()
+
+    db = DuckDBManager(str(db_path))
+    try:
+        assert db.insert_embedding("New Row", "vector", {}, None, _unit_vector(2), "m")
+    finally:
+        db.close()
+
+
+def test_struct_column_tolerates_untyped_properties(tmp_path):
+    # properties is schemaless input; values that do not fit the typed
+    # struct column must become NULL (or coerce cleanly) instead of
+    # failing the insert. The JSON column keeps the originals either way.
+    db = DuckDBManager(str(tmp_path / "t.duckdb"))
+    try:
+        row_id = db.insert_embedding(
+            "City", "vector",
+            {"population": "8,175,133", "country": {"code": "US"}},
+            None, _unit_vector(5), "m")
+        batch_ids = db.insert_embeddings_batch(
+            ["A", "B"],
+            [{"population": "many", "country": "US", "description": 7},
+             {"population": "8175133"}],
+            [None, None], np.stack([_unit_vector(6), _unit_vector(7)]), "m")
+
+        structs = {str(r[0]): r[1] for r in db.conn.execute(
+            "SELECT id, properties_struct FROM geospatial_embeddings").fetchall()}
+        assert structs[row_id]["population"] is None
+        assert structs[row_id]["country"] is None
+        assert structs[batch_ids[0]]["population"] is None
+        assert structs[batch_ids[0]]["country"] == "US"
+        assert structs[batch_ids[0]]["description"] == "7"
+        assert structs[batch_ids[1]]["population"] == 8175133
+
+        props = db.conn.execute(
+            "SELECT properties FROM geospatial_embeddings WHERE id = ?", (row_id,)).fetchone()[0]
+        assert json.loads(props)["population"] == "8,175,133"
+    finally:
+        db.close()
+
+
+def test_in_process_index_respects_threshold(tmp_path):
+    # The unfiltered default search is answered by the in-process index;
+    # it must apply the same similarity >= threshold filter as the SQL
+    # scan paths, or results change with the installed backend.
+    db = DuckDBManager(str(tmp_path / "t.duckdb"))
+    try:
+        query = _unit_vector(4)
+        db.insert_embedding("Near", "vector", {}, None, query, "m")
+        db.insert_embedding("Far", "vector", {}, None, -query, "m")
+
+        results = db.similarity_search(query, k=10)
+        assert [r["name"] for r in results] == ["Near"]
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("index_cls",
+                         [BruteForceVectorIndex] + ([FaissVectorIndex] if FAISS_AVAILABLE else []))
+def test_vector_index_concurrent_adds_stay_aligned(index_cls):
+    # Inserts reach the in-process index from FastAPI worker threads;
+    # unsynchronized adds crash faiss outright and silently misalign the
+    # brute-force fallback's ids and vectors.
+    index = index_cls(EMBEDDING_DIM)
+    vectors = {f"id{i}": _unit_vector(100 + i) for i in range(32)}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda item: index.add([item[0]], item[1].reshape(1, -1)),
+                          vectors.items()))
+
+    assert len(index) == len(vectors)
+    for row_id in ("id0", "id17", "id31"):
+        hit_id, score = index.search(vectors[row_id], 1)[0]
+        assert hit_id == row_id
+        assert score == pytest.approx(1.0, abs=1e-4)
+
+
+def test_skips_ddl_on_current_schema(tmp_path):
+    db_path = tmp_path / "fresh.duckdb"
+    db = DuckDBManager(str(db_path))
+    db.insert_embedding("Row", "vector", {}, None, _unit_vector(3), "m")
+    db.close()
+
+    # Reopening a current database must not lose or break anything.
+    db = DuckDBManager(str(db_path))
+    try:
+        assert db.get_stats()["total_embeddings"] == 1
+    finally:
+        db.close()
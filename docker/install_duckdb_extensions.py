@@ -4,11 +4,21 @@ Pre-install DuckDB extensions to avoid runtime network issues.
 This is especially important for ARM64 containers that may have network connectivity issues.
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import duckdb
 
-def install_extension(conn, extension_name):
-    """Install and load a DuckDB extension with error handling."""
+def install_extension(extension_name):
+    """Install and load a DuckDB extension on its own connection, with error handling."""
+    conn = duckdb.connect(':memory:')
     try:
+        # Install into the same directory the API loads from at runtime
+        # (DUCKDB_EXTENSION_DIRECTORY, baked into the image), so startup is
+        # a bare LOAD with no install step or network access.
+        ext_dir = os.environ.get('DUCKDB_EXTENSION_DIRECTORY')
+        if ext_dir:
+            conn.execute(f"SET extension_directory = '{ext_dir}'")
         conn.execute(f'INSTALL {extension_name}')
         conn.execute(f'LOAD {extension_name}')
         print(f'Successfully pre-installed {extension_name} extension')
@@ -16,20 +26,21 @@ def install_extension(conn, extension_name):
     except Exception as e:
         print(f'Warning: Could not pre-install {extension_name} extension: {e}')
         return False
+    finally:
+        conn.close()
 
 def main():
     """Main function to install DuckDB extensions."""
-    conn = duckdb.connect(':memory:')
-    
-    extensions = ['spatial', 'json']
-    success_count = 0
-    
-    for extension in extensions:
-        if install_extension(conn, extension):
-            success_count += 1
-    
-    conn.close()
+    extensions = ['spatial', 'json', 'vss']
+
+    # Each install is a network download; running them on separate
+    # connections in parallel overlaps the round-trips, so the build step
+    # takes as long as the slowest download instead of their sum.
+    with ThreadPoolExecutor(max_workers=len(extensions)) as executor:
+        results = list(executor.map(install_extension, extensions))
+
+    success_count = sum(results)
     print(f'Pre-installation complete: {success_count}/{len(extensions)} extensions installed successfully')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
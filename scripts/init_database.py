@@ -35,17 +35,12 @@ def main():
     embedder = ContextLanguageEmbedder()
 
     features = load_sample_cities()
-    for f in features:
-        emb = embedder.embed_feature(f)
-        db.insert_embedding(
-            name=f['properties']['name'],
-            source_type="vector",
-            properties=f['properties'],
-            geometry=json.dumps(f['geometry']),
-            embedding=emb,
-            model=embedder.model_name
-        )
-    print(f"Inserted {len(features)} sample embeddings.")
+    embeddings = embedder.embed_features(features)
+    names = [f['properties']['name'] for f in features]
+    props = [f['properties'] for f in features]
+    geoms = [json.dumps(f['geometry']) for f in features]
+    ids = db.insert_embeddings_batch(names, props, geoms, embeddings, embedder.model_name)
+    print(f"Inserted {len(ids)} sample embeddings.")
     print("DB stats:", db.get_stats())
     db.close()
 